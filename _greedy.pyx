@@ -0,0 +1,101 @@
+# cython: boundscheck=False, wraparound=False, language_level=3
+#
+# Compiled run-length compression for the greedy meshing in voxel_grid.py.
+# Build it in place with `cythonize -i _greedy.pyx`; without the compiled module the voxel grid uses its pure python
+# implementation instead.
+
+import numpy as np
+from libc.stdint cimport int8_t, int32_t
+
+def capture_rows(const int8_t[:, :, ::1] grid, int8_t value):
+  """
+  Captures the runs of cells with the given value along the x-axis.
+  
+  :param grid: A C-contiguous int8 voxel grid.
+  :type grid: np.ndarray
+  :param value: The cell value to capture runs of.
+  :type value: int
+  :return: An int32 array of shape (N, 4) with rows (y, z, x_start, x_end).
+  :rtype: np.ndarray
+  """
+  
+  cdef Py_ssize_t size_x = grid.shape[0], size_y = grid.shape[1], size_z = grid.shape[2]
+  cdef Py_ssize_t x, y, z, row_count = 0
+  
+  # The x-axis has the largest stride, so it is the outer loop and the open runs of all (y, z) columns are tracked.
+  with nogil:
+    for y in range(size_y):
+      for z in range(size_z):
+        if grid[0, y, z] == value:
+          row_count += 1
+    for x in range(1, size_x):
+      for y in range(size_y):
+        for z in range(size_z):
+          if grid[x, y, z] == value and grid[x - 1, y, z] != value:
+            row_count += 1
+  
+  rows = np.empty((row_count, 4), dtype=np.int32)
+  cdef int32_t[:, ::1] rows_view = rows
+  run_starts = np.full((size_y, size_z), -1, dtype=np.int32)
+  cdef int32_t[:, ::1] run_start = run_starts
+  cdef Py_ssize_t row = 0
+  cdef bint filled
+  
+  with nogil:
+    for x in range(size_x + 1):
+      for y in range(size_y):
+        for z in range(size_z):
+          filled = x < size_x and grid[x, y, z] == value
+          if filled and run_start[y, z] < 0:
+            run_start[y, z] = x
+          elif not filled and run_start[y, z] >= 0:
+            rows_view[row, 0] = y
+            rows_view[row, 1] = z
+            rows_view[row, 2] = run_start[y, z]
+            rows_view[row, 3] = x - 1
+            run_start[y, z] = -1
+            row += 1
+  
+  return rows
+
+cdef Py_ssize_t capture_plane(const int32_t[:, ::1] rows, Py_ssize_t start) noexcept nogil:
+  """
+  Expands the row at start along the y-axis while the following rows have the same z-position and x-extents and 
+  continue it by one y-position. Returns the index after the last row of the plane.
+  """
+  
+  cdef Py_ssize_t end = start + 1
+  while (end < rows.shape[0]
+         and rows[end, 1] == rows[start, 1]
+         and rows[end, 2] == rows[start, 2]
+         and rows[end, 3] == rows[start, 3]
+         and rows[end, 0] == rows[end - 1, 0] + 1):
+    end += 1
+  return end
+
+def capture_planes(const int32_t[:, ::1] rows):
+  """
+  Merges row segments with equal x-extents in consecutive y-positions of the same z-position into planes.
+  
+  :param rows: An int32 array of shape (N, 4) with rows (y, z, x_start, x_end), sorted by z, x_start, x_end and y.
+  :type rows: np.ndarray
+  :return: An int32 array of shape (M, 5) with rows (x_start, y_start, x_end, y_end, z).
+  :rtype: np.ndarray
+  """
+  
+  cdef Py_ssize_t row_count = rows.shape[0], start = 0, end, plane_count = 0
+  planes = np.empty((row_count, 5), dtype=np.int32)
+  cdef int32_t[:, ::1] planes_view = planes
+  
+  with nogil:
+    while start < row_count:
+      end = capture_plane(rows, start)
+      planes_view[plane_count, 0] = rows[start, 2]
+      planes_view[plane_count, 1] = rows[start, 0]
+      planes_view[plane_count, 2] = rows[start, 3]
+      planes_view[plane_count, 3] = rows[end - 1, 0]
+      planes_view[plane_count, 4] = rows[start, 1]
+      plane_count += 1
+      start = end
+  
+  return planes[:plane_count]
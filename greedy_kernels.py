@@ -0,0 +1,184 @@
+import numpy as np
+from numba import njit, prange
+
+# Numba compiled kernels for the greedy meshing in voxel_grid.py.
+# Importing this module fails when numba is not installed, the voxel grid then uses its pure python implementation.
+
+@njit(cache=True)
+def capture_quads_from_planes(planes):
+  """
+  Merges planes with equal extents in consecutive z-positions into quads.
+  
+  :param planes: An array of shape (N, 5) with rows (x_start, y_start, x_end, y_end, z_position), sorted lexicographically
+    so that planes with equal extents are adjacent and ordered by their z-position.
+  :type planes: np.ndarray
+  :return: An array of shape (M, 6) with rows (x_start, y_start, z_start, x_end, y_end, z_end).
+  :rtype: np.ndarray
+  """
+  
+  quads = np.empty((len(planes), 6), dtype=np.int32)
+  quad_count = 0
+  start = 0
+  while start < len(planes):
+    end = start + 1
+    while (end < len(planes)
+           and planes[end, 0] == planes[start, 0]
+           and planes[end, 1] == planes[start, 1]
+           and planes[end, 2] == planes[start, 2]
+           and planes[end, 3] == planes[start, 3]
+           and planes[end, 4] == planes[end - 1, 4] + 1):
+      end += 1
+    quads[quad_count, 0] = planes[start, 0]
+    quads[quad_count, 1] = planes[start, 1]
+    quads[quad_count, 2] = planes[start, 4]
+    quads[quad_count, 3] = planes[start, 2]
+    quads[quad_count, 4] = planes[start, 3]
+    quads[quad_count, 5] = planes[end - 1, 4]
+    quad_count += 1
+    start = end
+  return quads[:quad_count]
+
+@njit(cache=True)
+def find_row(y_position, z_position, segment_id, line_keys, line_starts, line_ends, segment_ids, alive):
+  """
+  Finds an alive row segment with the given segment id in the (y, z) line.
+  
+  :return: The index of the row segment or -1 if there is none.
+  :rtype: int
+  """
+  
+  key = (np.int64(y_position) << 32) | np.int64(z_position)
+  line = np.searchsorted(line_keys, key)
+  if line == len(line_keys) or line_keys[line] != key:
+    return -1
+  for row in range(line_starts[line], line_ends[line]):
+    if alive[row] and segment_ids[row] == segment_id:
+      return row
+  return -1
+
+@njit(cache=True)
+def capture_plane(y_position, z_position, segment_id, line_keys, line_starts, line_ends, segment_ids, alive):
+  """
+  Expands a row segment along the y-axis in both directions while the neighboring lines contain an alive row segment with
+  the same extents, marking every merged row segment as dead.
+  
+  :return: The first and last y-position of the plane.
+  :rtype: Tuple[int, int]
+  """
+  
+  # start with zero so the original row gets marked as well.
+  offset_minus = 0
+  while True:
+    row = find_row(y_position + offset_minus, z_position, segment_id, line_keys, line_starts, line_ends, segment_ids, alive)
+    if row < 0:
+      break
+    alive[row] = False
+    offset_minus -= 1
+  offset_minus += 1
+  
+  offset_plus = 1
+  while True:
+    row = find_row(y_position + offset_plus, z_position, segment_id, line_keys, line_starts, line_ends, segment_ids, alive)
+    if row < 0:
+      break
+    alive[row] = False
+    offset_plus += 1
+  offset_plus -= 1
+  
+  return y_position + offset_minus, y_position + offset_plus
+
+@njit(cache=True, parallel=True)
+def capture_planes_from_rows(rows, segment_ids, line_keys, line_starts, line_ends):
+  """
+  Merges row segments with equal extents in consecutive y-positions into planes.
+  A plane never leaves its z-slice, so the z-slices are processed in parallel.
+  
+  :param rows: An array of shape (N, 4) with rows (y, z, x_start, x_end), grouped by their (y, z) line.
+  :type rows: np.ndarray
+  :param segment_ids: The id of the (x_start, x_end) extents of each row, equal ids mean equal extents.
+  :type segment_ids: np.ndarray
+  :param line_keys: The sorted packed keys (y << 32) | z of the lines.
+  :type line_keys: np.ndarray
+  :param line_starts: The index of the first row segment of each line.
+  :type line_starts: np.ndarray
+  :param line_ends: The index after the last row segment of each line.
+  :type line_ends: np.ndarray
+  :return: An array of shape (M, 5) with rows (x_start, y_start, x_end, y_end, z_position).
+  :rtype: np.ndarray
+  """
+  
+  alive = np.ones(len(rows), dtype=np.bool_)
+  
+  # the rows of every z-slice, keeping their order by y
+  slice_order = np.argsort(rows[:, 1], kind='mergesort')
+  slice_bounds = [0]
+  for index in range(1, len(rows)):
+    if rows[slice_order[index], 1] != rows[slice_order[index - 1], 1]:
+      slice_bounds.append(index)
+  slice_bounds.append(len(rows))
+  
+  # Every plane is stored at the index of the row it was started from, which keeps the result independent of the 
+  # order in which the slices finish.
+  planes = np.empty((len(rows), 5), dtype=np.int32)
+  starts_plane = np.zeros(len(rows), dtype=np.bool_)
+  for slice_index in prange(len(slice_bounds) - 1):
+    for index in range(slice_bounds[slice_index], slice_bounds[slice_index + 1]):
+      row = slice_order[index]
+      if not alive[row]:
+        continue
+      y_start, y_end = capture_plane(
+        rows[row, 0], rows[row, 1], segment_ids[row], line_keys, line_starts, line_ends, segment_ids, alive
+      )
+      planes[row, 0] = rows[row, 2]
+      planes[row, 1] = y_start
+      planes[row, 2] = rows[row, 3]
+      planes[row, 3] = y_end
+      planes[row, 4] = rows[row, 1]
+      starts_plane[row] = True
+  return planes[starts_plane]
+
+@njit(cache=True, parallel=True)
+def capture_rows_from_grid(grid, value):
+  """
+  Finds the runs of cells with the given value along the x-axis without any temporary grid-sized arrays.
+  The runs of every line are counted first so that every y-slab can write its runs to its own part of the output in 
+  parallel.
+  
+  :param grid: A 3D array holding the cell types.
+  :type grid: np.ndarray
+  :param value: The cell type of the runs.
+  :type value: int
+  :return: An array of shape (N, 4) with rows (y, z, x_start, x_end), ordered by y, z and x_start.
+  :rtype: np.ndarray
+  """
+  
+  size_x, size_y, size_z = grid.shape
+  
+  line_counts = np.zeros((size_y, size_z), dtype=np.int32)
+  for y in prange(size_y):
+    for x in range(size_x):
+      for z in range(size_z):
+        if grid[x, y, z] == value and (x == 0 or grid[x - 1, y, z] != value):
+          line_counts[y, z] += 1
+  
+  line_offsets = np.zeros(size_y * size_z + 1, dtype=np.int64)
+  line_offsets[1:] = np.cumsum(line_counts.ravel())
+  
+  rows = np.empty((line_offsets[-1], 4), dtype=np.int32)
+  for y in prange(size_y):
+    run_starts = np.full(size_z, -1, dtype=np.int32)
+    next_rows = line_offsets[y * size_z:(y + 1) * size_z].copy()
+    for x in range(size_x + 1):
+      for z in range(size_z):
+        inside = x < size_x and grid[x, y, z] == value
+        if inside and run_starts[z] < 0:
+          run_starts[z] = x
+        elif not inside and run_starts[z] >= 0:
+          row = next_rows[z]
+          rows[row, 0] = y
+          rows[row, 1] = z
+          rows[row, 2] = run_starts[z]
+          rows[row, 3] = x - 1
+          next_rows[z] += 1
+          run_starts[z] = -1
+  return rows
@@ -0,0 +1,72 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+
+import numpy as np
+
+from .voxel_grid import VoxelGrid
+
+# Profiling harness for the two stages of the greedy meshing in voxel_grid.py. It needs bpy, so run it from the python
+# console in Blender:
+#
+#   from add_mesh_space_tree.profile_greedy import profile_greedy_meshing
+#   profile_greedy_meshing()
+#
+# The stages are bound by different things, which decides which optimizations pay off:
+# - capture_rows is memory-bound. It streams the whole grid, so its time grows with the number of cells. It gets faster
+#   by touching fewer bytes: narrow dtypes, views instead of copies, and a single pass in compiled code.
+# - The plane capture is latency-bound. Its working set is tiny, but the pure python implementation pays interpreter
+#   overhead for every row and plane, so its time grows with the number of rows rather than the number of cells. It gets
+#   faster by leaving the interpreter (numba, Cython) or by doing fewer python operations per row (bitmaps). SIMD does not
+#   help it.
+
+# The configuration values that are lengths and get multiplied by the scale.
+SCALED_CONFIGURATION_KEYS = ["stem_height", "stem_diameter", "crown_width", "crown_height", "crown_offset"]
+
+def profile_greedy_meshing(scales=(1, 2, 4), configuration_name: str = "spreading_tree.json", top: int = 15):
+  """
+  Times capture_rows and the plane capture on one tree of the given configuration per scale and prints the cProfile
+  statistics of all runs. The time of capture_rows should scale with the cells, the time of the planes with the rows.
+
+  :param scales: The factors the lengths of the tree configuration are multiplied with.
+  :type scales: Tuple[float, ...]
+  :param configuration_name: The file name of a tree configuration in the tree_configs directory.
+  :type configuration_name: str
+  :param top: The number of functions to print the statistics of.
+  :type top: int
+  :return: None
+  :rtype: None
+  """
+
+  with open(os.path.join(os.path.dirname(__file__), "tree_configs", configuration_name)) as tree_config_json:
+    tree_configuration = json.load(tree_config_json)
+
+  voxel_grid = VoxelGrid()
+
+  # compile the numba kernels before anything is timed
+  voxel_grid.capture_planes(np.full((2, 2, 2), 2, dtype=np.int8))
+
+  profiler = cProfile.Profile()
+  print(f"{'scale':>6} {'cells':>12} {'rows':>10} {'planes':>10} {'rows (s)':>10} {'planes (s)':>11}")
+  for scale in scales:
+    scaled_configuration = dict(tree_configuration)
+    for key in SCALED_CONFIGURATION_KEYS:
+      scaled_configuration[key] = tree_configuration[key] * scale
+    voxel_grid.add_tree((0, 0, 0), 0, scaled_configuration)
+    tree_grid = voxel_grid.trees[-1][-1]
+
+    profiler.enable()
+    start = time.perf_counter()
+    rows = voxel_grid.capture_rows(tree_grid)
+    rows_time = time.perf_counter() - start
+    start = time.perf_counter()
+    planes = voxel_grid.capture_planes(tree_grid)
+    # capture_planes captures the rows again, which is not part of the plane time
+    planes_time = time.perf_counter() - start - rows_time
+    profiler.disable()
+
+    print(f"{scale:>6} {tree_grid.size:>12} {len(rows):>10} {len(planes):>10} {rows_time:>10.4f} {planes_time:>11.4f}")
+
+  pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
@@ -1,7 +1,9 @@
 import bpy
+import hashlib
 import numpy as np
-import bmesh
 import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from skimage.measure import marching_cubes
 from typing import Tuple, List, Dict, Set, Any
@@ -10,12 +12,81 @@ from scipy.ndimage import distance_transform_edt
 
 from .poisson_disk_sampling import poisson_disk_sampling_on_surface
 
+try:
+  from .greedy_kernels import capture_quads_from_planes, capture_planes_from_rows, capture_rows_from_grid
+except ImportError:
+  print('greedy_kernels not available, using pure python implementation instead')
+  capture_quads_from_planes = None
+  capture_planes_from_rows = None
+  capture_rows_from_grid = None
+
+try:
+  from ._greedy import capture_rows as capture_rows_compiled, capture_planes as capture_planes_compiled
+except ImportError:
+  print('_greedy.capture_rows() and _greedy.capture_planes() not available, using pure python implementation instead')
+  capture_rows_compiled = None
+  capture_planes_compiled = None
+
 class CellType(Enum):
   no_tree = 0
   stem = 1
   crown = 2
   collision = 3
 
+# The axis and direction of each voxel face (left, right, front, back, bottom, top) together with the
+# offsets of its four corners, where a corner offset of 0 or 1 lies half a voxel below or above the voxel center.
+FACE_CORNERS = [
+  (0, -1, np.array([(0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0)], dtype=np.int32)),
+  (0, 1, np.array([(1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0)], dtype=np.int32)),
+  (1, -1, np.array([(0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1)], dtype=np.int32)),
+  (1, 1, np.array([(0, 1, 0), (1, 1, 0), (1, 1, 1), (0, 1, 1)], dtype=np.int32)),
+  (2, -1, np.array([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], dtype=np.int32)),
+  (2, 1, np.array([(0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)], dtype=np.int32)),
+]
+
+# The eight corners of a cuboid, True where the corner takes the end instead of the start coordinate,
+# and the corner indices of its bottom, top, front, back, left and right faces.
+CUBOID_CORNERS = np.array([
+  (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+  (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)
+], dtype=bool)
+CUBOID_FACES = np.array([
+  [0, 1, 2, 3],
+  [4, 5, 6, 7],
+  [0, 1, 5, 4],
+  [2, 3, 7, 6],
+  [0, 3, 7, 4],
+  [1, 2, 6, 5]
+])
+
+# The bounds of the random sphere radius used to assign collision cells to one of the two trees.
+COLLISION_SPHERE_MIN_RADIUS = 1
+COLLISION_SPHERE_MAX_RADIUS = 3
+
+def compute_sphere_cells(radius: int):
+  """
+  Computes the cells within a sphere of a given radius centered at the origin.
+  
+  :param radius: The radius of the sphere.
+  :type radius: int
+  :return: A read-only numpy array of shape (N, 3) containing the points inside the sphere.
+  :rtype: np.ndarray
+  """
+  
+  x, y, z = np.ogrid[-radius:radius + 1, -radius:radius + 1, -radius:radius + 1]
+  
+  distances = x**2 + y**2 + z**2
+  
+  inside_sphere = np.argwhere(distances <= radius**2) - radius
+  inside_sphere.flags.writeable = False
+  
+  return inside_sphere
+
+SPHERE_CELLS = {
+  radius: compute_sphere_cells(radius) 
+  for radius in range(COLLISION_SPHERE_MIN_RADIUS, COLLISION_SPHERE_MAX_RADIUS + 1)
+}
+
 class VoxelGrid:
   """
   The class used to manage trees in a simulated forest.
@@ -31,6 +102,17 @@ class VoxelGrid:
     # The first three elements of this tuple are the position of the tree, with the position of the tree being the position of the stem.
     # This position is in the middle of the grid (4th element). This does not need to be true when the crown is asymmetrical.
     self.trees: List[Tuple[int, int, int, int, np.ndarray]] = []
+    
+    # The positions and configuration indices of the trees as arrays, so they can be used without unpacking the tuples.
+    self.tree_positions = np.empty((0, 3), dtype=np.int32)
+    self.tree_configuration_indices = np.empty(0, dtype=np.int32)
+    
+    # The crown cells of each tree by tree index as bits packed along the z-axis, dropped whenever the grid
+    # of the tree changes.
+    self.crown_bitplane_cache: Dict[int, np.ndarray] = {}
+    
+    # The quads captured for greedy meshing by the shape and a digest of the tree grid they were captured from.
+    self.quad_cache: Dict[Tuple[Tuple[int, int, int], bytes], np.ndarray] = {}
 
     self.cube_size = 0.5
 
@@ -43,71 +125,74 @@ class VoxelGrid:
     mesh = bpy.data.meshes.new("CrownMesh")
     obj = bpy.data.objects.new(f"Crown_Voxel_{index}", mesh)
 
-    bm = bmesh.new()
-    
     tree_grid = self.trees[index][-1]
+    crown = tree_grid == CellType.crown.value
 
-    for x in range(len(tree_grid)):
-        for y in range(len(tree_grid[x])):
-            for z in range(len(tree_grid[x][y])):
-                if tree_grid[x][y][z] == CellType.crown.value:
-                    self.add_voxel_to_bmesh(bm, x, y, z, tree_grid, self.cube_size)
+    # Only faces that do not touch another crown voxel are part of the surface.
+    neighbor_bitmap = self.get_neighbor_bitmap(crown)
+    face_corners = []
+    for bit, (_, _, corners) in enumerate(FACE_CORNERS):
+      exposed = crown & ((neighbor_bitmap & (1 << bit)) == 0)
+      voxels = np.argwhere(exposed).astype(np.int32)
+      face_corners.append(voxels[:, None, :] + corners[None, :, :])
 
-    bm.to_mesh(mesh)
-    bm.free()
+    # corner coordinates are whole numbers, voxel centers lie half a cube size in between
+    self.build_mesh(mesh, np.concatenate(face_corners), self.cube_size, -self.cube_size / 2)
     obj.location = tuple(np.array(self.trees[index][:3]) * self.cube_size)
     return obj
+
+  def get_neighbor_bitmap(self, filled: np.ndarray):
+    """
+    Computes for every cell which of its six neighbors are filled.
+    Bit i of a cell is set when the neighbor in the direction of the i-th entry of `FACE_CORNERS` is filled.
+    Neighbors outside of the grid are treated as empty.
+    
+    :param filled: The boolean voxel mask.
+    :type filled: np.ndarray
+    :return: An array of the same shape holding the neighbor bits of each cell.
+    :rtype: np.ndarray
+    """
+    
+    padded = np.pad(filled, 1)
+    bitmap = np.zeros(filled.shape, dtype=np.uint8)
+    for bit, (axis, direction, _) in enumerate(FACE_CORNERS):
+      neighbor = [slice(1, -1)] * 3
+      neighbor[axis] = slice(1 + direction, padded.shape[axis] - 1 + direction)
+      bitmap |= padded[tuple(neighbor)].view(np.uint8) << bit
+    return bitmap
   
-  def add_voxel_to_bmesh(self, bm, x, y, z, tree_grid, size):
-    voxel_pos = (x * size, y * size, z * size)
-    
-    offsets = [
-      (-1, 0, 0), 
-      (1, 0, 0), 
-      (0, -1, 0), 
-      (0, 1, 0), 
-      (0, 0, -1), 
-      (0, 0, 1)
-    ]
+  def build_mesh(self, mesh, face_corners: np.ndarray, scale: float, offset: float):
+    """
+    Fills a mesh with quad faces given by the integer lattice coordinates of their corners.
+    Coincident corners are merged into a single vertex so that adjacent faces share their vertices.
+    
+    :param mesh: The mesh to fill.
+    :type mesh: bpy.types.Mesh
+    :param face_corners: An array of shape (..., 4, 3) containing the lattice coordinates of the corners of each face.
+    :type face_corners: np.ndarray
+    :param scale: The distance between two neighboring lattice coordinates.
+    :type scale: float
+    :param offset: The position of the lattice origin.
+    :type offset: float
+    :return: None
+    :rtype: None
+    """
     
-    neighbors_filled = self.get_neighbors_filled(x, y, z, offsets, tree_grid)
-    index_to_face_direction = ["left", "right", "front", "back", "bottom", "top"]
-    for index, neighbor in enumerate(neighbors_filled):
-      if not neighbor:
-        self.add_face_to_bmesh(bm, voxel_pos, size, index_to_face_direction[index])
-
-  def add_face_to_bmesh(self, bm, position, size, face):
-    x, y, z = position
-    hs = size / 2.0  # Half-size of the cube
-    
-    # Define cube vertices
-    if face == "left":
-        verts = [(x - hs, y - hs, z - hs), (x - hs, y - hs, z + hs), (x - hs, y + hs, z + hs), (x - hs, y + hs, z - hs)]
-    elif face == "right":
-        verts = [(x + hs, y - hs, z - hs), (x + hs, y - hs, z + hs), (x + hs, y + hs, z + hs), (x + hs, y + hs, z - hs)]
-    elif face == "front":
-        verts = [(x - hs, y - hs, z - hs), (x + hs, y - hs, z - hs), (x + hs, y - hs, z + hs), (x - hs, y - hs, z + hs)]
-    elif face == "back":
-        verts = [(x - hs, y + hs, z - hs), (x + hs, y + hs, z - hs), (x + hs, y + hs, z + hs), (x - hs, y + hs, z + hs)]
-    elif face == "bottom":
-        verts = [(x - hs, y - hs, z - hs), (x + hs, y - hs, z - hs), (x + hs, y + hs, z - hs), (x - hs, y + hs, z - hs)]
-    elif face == "top":
-        verts = [(x - hs, y - hs, z + hs), (x + hs, y - hs, z + hs), (x + hs, y + hs, z + hs), (x - hs, y + hs, z + hs)]
-
-    bm_verts = [bm.verts.new(v) for v in verts]
-    bm.faces.new(bm_verts)
+    corners, vertex_indices = np.unique(face_corners.reshape(-1, 3), axis=0, return_inverse=True)
+    verts = corners.astype(np.float32) * np.float32(scale) + np.float32(offset)
+    loop_vertex_indices = vertex_indices.astype(np.int32).ravel()
+    face_count = len(loop_vertex_indices) // 4
+    
+    # foreach_set copies whole buffers, which is much faster than from_pydata for large meshes
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.ravel())
+    mesh.loops.add(len(loop_vertex_indices))
+    mesh.loops.foreach_set("vertex_index", loop_vertex_indices)
+    mesh.polygons.add(face_count)
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(loop_vertex_indices), 4, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_total", np.full(face_count, 4, dtype=np.int32))
+    mesh.update(calc_edges=True)
   
-  def get_neighbors_filled(self, x, y, z, offsets, tree_grid):
-    filled_neighbors = []
-    for offset in offsets:
-      filled_neighbors.append(self.is_filled(x + offset[0], y + offset[1], z + offset[2], tree_grid))
-    return filled_neighbors
-      
-  def is_filled(self, x, y, z, tree_grid):
-    if not (0 <= x < len(tree_grid) and 0 <= y < len(tree_grid[x]) and 0 <= z < len(tree_grid[x][y])):
-      return False 
-    return tree_grid[x][y][z] == CellType.crown.value
-      
   def generate_forest(self, tree_configurations: List[Dict[str, Any]], configuration_weights: List[float], surface: List[Tuple[int, int]]):
     crown_widths = [tree_configuration["crown_width"] for tree_configuration in tree_configurations]
     sampled_points = poisson_disk_sampling_on_surface(surface, configuration_weights, crown_widths)
@@ -141,19 +226,22 @@ class VoxelGrid:
     
     self.add_stem(tree_grid, stem_diameter, stem_height)
     crown_type_to_function[tree_configuration["crown_type"]](tree_grid, tree_configuration)
-    self.trees.append((int(position[0] / self.cube_size), int(position[1] / self.cube_size), int(position[2] / self.cube_size), configuration_identifier, tree_grid))
+    grid_position = (int(position[0] / self.cube_size), int(position[1] / self.cube_size), int(position[2] / self.cube_size))
+    self.trees.append((*grid_position, configuration_identifier, tree_grid))
+    self.tree_positions = np.vstack([self.tree_positions, np.array(grid_position, dtype=np.int32)])
+    self.tree_configuration_indices = np.append(self.tree_configuration_indices, np.int32(configuration_identifier))
     
   def add_stem(self, tree_grid: np.ndarray, stem_diameter: float, stem_height: float):
     stem_radius = int(stem_diameter / 2 / self.cube_size)
 
     #Add stem
-    stem_height_range = np.arange(int(stem_height / self.cube_size))
+    stem_height_cells = int(stem_height / self.cube_size)
     stem_diameter_range = np.arange(-int(stem_diameter / self.cube_size), int(stem_diameter / self.cube_size))
     j, k = np.meshgrid(stem_diameter_range, stem_diameter_range, indexing='ij')
     mask = j**2 + k**2 <= stem_radius**2
 
-    for i in stem_height_range:
-      tree_grid[j[mask]+tree_grid.shape[0]//2, k[mask]+tree_grid.shape[1]//2, i] = CellType.stem.value
+    # the disk indices select the columns, the slice fills each column up to the stem height
+    tree_grid[j[mask]+tree_grid.shape[0]//2, k[mask]+tree_grid.shape[1]//2, :stem_height_cells] = CellType.stem.value
   
   def add_ellipsoid_tree(self, tree_grid: np.ndarray, tree_configuration: dict[str, float]):
     """
@@ -181,13 +269,17 @@ class VoxelGrid:
     
     crown_range_xy = np.arange(-half_width_cube_size, half_width_cube_size + 1)
     crown_range_z = np.arange(-half_height_cube_size, half_height_cube_size + 1)
-    i, j, k = np.meshgrid(crown_range_xy, crown_range_xy, crown_range_z, indexing='ij')
+    i = crown_range_xy.reshape(-1, 1, 1)
+    j = crown_range_xy.reshape(1, -1, 1)
+    k = crown_range_z.reshape(1, 1, -1)
     mask = (i/half_width_cube_size)**2 + (j/half_width_cube_size)**2 + (k/half_height_cube_size)**2 <= 1
     
+    # the indices into the mask are shifted by the half sizes compared to the crown ranges
+    i, j, k = np.nonzero(mask)
     tree_grid[
-      i[mask]+tree_grid.shape[0]//2, 
-      j[mask]+tree_grid.shape[1]//2, 
-      k[mask] + int((stem_height-crown_offset) / self.cube_size + half_height_cube_size)
+      i - half_width_cube_size + tree_grid.shape[0]//2, 
+      j - half_width_cube_size + tree_grid.shape[1]//2, 
+      k - half_height_cube_size + int((stem_height-crown_offset) / self.cube_size + half_height_cube_size)
     ] = CellType.crown.value
     
   def add_columnar_tree(self, tree_grid: np.ndarray, tree_configuration: dict[str, float]):
@@ -198,18 +290,18 @@ class VoxelGrid:
     
     crown_radius = int(crown_diameter / 2 / self.cube_size)
     
-    crown_height_range = np.arange(int(crown_height / self.cube_size))
+    crown_start = int((stem_height - crown_offset) / self.cube_size)
+    crown_end = crown_start + int(crown_height / self.cube_size)
     crown_range = np.arange(-crown_radius, crown_radius + 1)
     
     j, k = np.meshgrid(crown_range, crown_range, indexing='ij')
     mask = j**2 + k**2 <= crown_radius**2
     
-    for i in crown_height_range:
-      tree_grid[
-        j[mask]+tree_grid.shape[0]//2, 
-        k[mask]+tree_grid.shape[1]//2, 
-        i + int((stem_height - crown_offset) / self.cube_size)
-      ] = CellType.crown.value 
+    tree_grid[
+      j[mask]+tree_grid.shape[0]//2, 
+      k[mask]+tree_grid.shape[1]//2, 
+      crown_start:crown_end
+    ] = CellType.crown.value 
       
   def add_spreading_tree(self, tree_grid: np.ndarray, tree_configuration: dict[str, float]):
     """
@@ -236,13 +328,17 @@ class VoxelGrid:
     
     crown_range_xy = np.arange(-half_width_cube_size, half_width_cube_size + 1)
     crown_range_z = np.arange(-half_height_cube_size, half_height_cube_size + 1)
-    i, j, k = np.meshgrid(crown_range_xy, crown_range_xy, crown_range_z, indexing='ij')
-    mask = (i/half_width_cube_size)**2 + (j/half_width_cube_size)**2 + (k/half_height_cube_size)**2 <= 1 & (k >= 0)
+    i = crown_range_xy.reshape(-1, 1, 1)
+    j = crown_range_xy.reshape(1, -1, 1)
+    k = crown_range_z.reshape(1, 1, -1)
+    mask = ((i/half_width_cube_size)**2 + (j/half_width_cube_size)**2 + (k/half_height_cube_size)**2 <= 1) & (k >= 0)
     
+    # the indices into the mask are shifted by the half sizes compared to the crown ranges
+    i, j, k = np.nonzero(mask)
     tree_grid[
-      i[mask]+tree_grid.shape[0]//2, 
-      j[mask]+tree_grid.shape[1]//2, 
-      k[mask] + int((stem_height-crown_offset) / self.cube_size)
+      i - half_width_cube_size + tree_grid.shape[0]//2, 
+      j - half_width_cube_size + tree_grid.shape[1]//2, 
+      k - half_height_cube_size + int((stem_height-crown_offset) / self.cube_size)
     ] = CellType.crown.value
   
   def evaluate_forest(self, tree_configurations: List[Dict[str, Any]]):
@@ -256,64 +352,154 @@ class VoxelGrid:
     """
     
     self.evaluated_forest = True
+    if len(self.trees) == 0:
+      return
     
-    tree_widths = [tree_configurations[tree[3]]["crown_width"] for tree in self.trees]
+    crown_widths = np.array([tree_configurations[i]["crown_width"] for i in range(len(tree_configurations))])
+    tree_widths = crown_widths[self.tree_configuration_indices]
+    
+    # Two crowns can only overlap when their stems are closer than the sum of their crown radii. The distance is
+    # measured in cells, the extra cell covers rounding the tree positions to the grid.
+    collision_ranges = (tree_widths[:, None] + tree_widths[None, :]) / 2 / self.cube_size + 1
+    
+    tree_positions = KDTree(self.tree_positions)
+    candidates = tree_positions.query_pairs(collision_ranges.max(), output_type='ndarray')
+    candidates = candidates[np.lexsort((candidates[:, 1], candidates[:, 0]))]
+    
+    distances = np.linalg.norm(self.tree_positions[candidates[:, 0]] - self.tree_positions[candidates[:, 1]], axis=1)
+    pairs_to_evaluate = candidates[distances <= collision_ranges[candidates[:, 0], candidates[:, 1]]]
+    
+    # seeded from the random module so the forest stays reproducible with random.seed
+    rng = np.random.default_rng(random.getrandbits(32))
+    rng.shuffle(pairs_to_evaluate, axis=0)
+    
+    # Every pair gets its own random generator, drawn in the shuffled order before anything runs concurrently, so the 
+    # result does not depend on the order in which the threads finish.
+    pairs_to_evaluate = pairs_to_evaluate.tolist()
+    pair_rngs = [np.random.default_rng(seed) for seed in rng.integers(0, 2**32, size=len(pairs_to_evaluate)).tolist()]
+    
+    # Pairs within a batch share no tree, so they only modify distinct grids and can be resolved in parallel.
+    # Most of the work happens in numpy, which releases the GIL.
+    with ThreadPoolExecutor() as executor:
+      for batch in self.get_independent_pair_batches(pairs_to_evaluate):
+        list(executor.map(
+          lambda pair_index: self.resolve_collision(*pairs_to_evaluate[pair_index], pair_rngs[pair_index]), 
+          batch
+        ))
+  
+  def get_independent_pair_batches(self, pairs: List[Tuple[int, int]]) -> List[List[int]]:
+    """
+    Splits the pairs of trees into batches in which no tree occurs twice by greedily coloring the pairs.
+    Each pair gets the lowest batch that does not contain a pair with one of its trees yet.
+    
+    :param pairs: The pairs of tree indices.
+    :type pairs: List[Tuple[int, int]]
+    :return: The batches as lists of indices into the pairs, ordered by their first pair.
+    :rtype: List[List[int]]
+    """
+    
+    batches = []
+    tree_batches: Dict[int, Set[int]] = defaultdict(set)
+    for pair_index, (index1, index2) in enumerate(pairs):
+      used_batches = tree_batches[index1] | tree_batches[index2]
+      batch = 0
+      while batch in used_batches:
+        batch += 1
+      if batch == len(batches):
+        batches.append([])
+      batches[batch].append(pair_index)
+      tree_batches[index1].add(batch)
+      tree_batches[index2].add(batch)
+    
+    return batches
+  
+  def get_crown_bitplane(self, index: int):
+    """
+    Returns the crown cells of a tree packed into bits along the z-axis, reusing the cached result if the tree grid did 
+    not change since. Byte k of a column holds the cells 8k to 8k+7, unused bits at the top are zero.
     
-    max_range = np.max(tree_widths)
+    :param index: The index of the tree.
+    :type index: int
+    :return: A uint8 array of shape (X, Y, ceil(Z / 8)).
+    :rtype: np.ndarray
+    """
     
-    tree_positions = KDTree([t[:3] for t in self.trees])
+    if index not in self.crown_bitplane_cache:
+      self.crown_bitplane_cache[index] = np.packbits(self.trees[index][-1] == CellType.crown.value, axis=-1)
+    return self.crown_bitplane_cache[index]
+  
+  def get_crown_mask(self, index: int):
+    """
+    Returns a boolean mask of the crown cells of a tree.
     
-    pairs_to_evaluate: Set[Tuple[int, int]] = set()
+    :param index: The index of the tree.
+    :type index: int
+    :return: A boolean array of the shape of the tree grid that is True for crown cells.
+    :rtype: np.ndarray
+    """
     
-    for i, tree in enumerate(self.trees):
-      potential_collisions = tree_positions.query_ball_point(tree[:3], max_range + tree_widths[i])
-      
-      for collision_index in potential_collisions:
-        if collision_index == i:
-          continue
-        pair = (min(i, collision_index), max(i, collision_index))
-        pairs_to_evaluate.add(pair)
-    
-    pairs_to_evaluate_list = list(pairs_to_evaluate)
-    random.shuffle(pairs_to_evaluate_list)
-    
-    for pair in pairs_to_evaluate_list:
-      tree = self.trees[pair[0]]
-      other_tree = self.trees[pair[1]]
-      self.resolve_collision(tree, other_tree)
+    return np.unpackbits(self.get_crown_bitplane(index), axis=-1, count=self.trees[index][-1].shape[2]).view(bool)
         
-  def resolve_collision(self, tree1: Tuple[int, int, int, np.ndarray], tree2: Tuple[int, int, int, np.ndarray]):
+  def resolve_collision(self, index1: int, index2: int, rng: np.random.Generator):
     """
     Resolves the collision between two voxel grids representing trees.
     In this algorithm, some cells are marked as collision cells with specific values.
     After the algorithm is done, all collision cells will be either one or zero.  
-    
-    :param tree1: The first tree's position and voxel grid.
-    :type tree1: Tuple[int, int, int, np.ndarray]
-    :param tree2: The second tree's position and voxel grid.
-    :type tree2: Tuple[int, int, int, np.ndarray]
+    Only the grids and cached crowns of the two trees are modified.
+    
+    :param index1: The index of the first tree.
+    :type index1: int
+    :param index2: The index of the second tree.
+    :type index2: int
+    :param rng: The random generator used to assign the collision cells.
+    :type rng: np.random.Generator
     :return: None
     :rtype: None
     """
     
-    x1, y1, z1, _, tree1_grid = tree1
-    x2, y2, z2, _, tree2_grid = tree2
+    x1, y1, z1, _, tree1_grid = self.trees[index1]
+    x2, y2, z2, _, tree2_grid = self.trees[index2]
     
     tree1_shape = tree1_grid.shape
     tree2_shape = tree2_grid.shape
     translation = np.array([x1, y1, z1]) - np.array([tree1_shape[0]/2, tree1_shape[1]/2, 0]) - np.array([x2, y2, z2]) + np.array([tree2_shape[0]/2, tree2_shape[1]/2, 0])
     translation = translation.astype(int)
     
-    tree1_filled_cells = np.argwhere(tree1_grid == CellType.crown.value)
-    
-    # translate to tree2 coordinate space
-    tree1_filled_cells = tree1_filled_cells + translation
-    
-    tree2_collision_cells = self.get_colliding_cells(tree2_grid, tree1_filled_cells)
+    # the part of tree2's grid that is covered by tree1's grid, in tree2 coordinate space
+    overlap_lower = np.maximum(translation, 0)
+    overlap_upper = np.minimum(translation + tree1_shape, tree2_shape)
+    if np.any(overlap_upper <= overlap_lower):
+      return
+    tree1_overlap = tuple(slice(start, end) for start, end in zip(overlap_lower - translation, overlap_upper - translation))
+    tree2_overlap = tuple(slice(start, end) for start, end in zip(overlap_lower, overlap_upper))
+    
+    colliding_lower = overlap_lower.copy()
+    if translation[2] % 8 == 0:
+      # The grids are shifted by whole bytes along z, so the packed bitplanes can be intersected directly and only the 
+      # result needs to be unpacked. Bits above the top of either grid are zero and never collide.
+      byte_lower = overlap_lower[2] // 8
+      byte_upper = -(-overlap_upper[2] // 8)
+      byte_shift = translation[2] // 8
+      colliding_bytes = (
+        self.get_crown_bitplane(index1)[tree1_overlap[0], tree1_overlap[1], byte_lower - byte_shift:byte_upper - byte_shift]
+        & self.get_crown_bitplane(index2)[tree2_overlap[0], tree2_overlap[1], byte_lower:byte_upper]
+      )
+      if not colliding_bytes.any():
+        return
+      colliding = np.unpackbits(colliding_bytes, axis=-1).view(bool)
+      colliding_lower[2] = byte_lower * 8
+    else:
+      colliding = self.get_crown_mask(index1)[tree1_overlap] & self.get_crown_mask(index2)[tree2_overlap]
+    
+    tree2_collision_cells = np.argwhere(colliding) + colliding_lower
     if len(tree2_collision_cells) == 0:
       return
     tree1_collision_cells = tree2_collision_cells - translation
     
+    # both grids are changed from here on
+    self.crown_bitplane_cache.pop(index1, None)
+    self.crown_bitplane_cache.pop(index2, None)
+    
     tree1_collision_edge_cells = self.get_collision_edge_cells(tree1_grid, tree2_collision_cells - translation)
     tree2_collision_edge_cells = self.get_collision_edge_cells(tree2_grid, tree2_collision_cells)
     
@@ -321,16 +507,7 @@ class VoxelGrid:
     tree1_grid[tree1_collision_cells[:, 0], tree1_collision_cells[:, 1], tree1_collision_cells[:, 2]] = CellType.collision.value
     tree2_grid[tree2_collision_cells[:, 0], tree2_collision_cells[:, 1], tree2_collision_cells[:, 2]] = CellType.collision.value
     
-    self.assign_collision_cells(tree1_grid, tree2_grid, tree1_collision_edge_cells, tree2_collision_edge_cells, translation)
-  
-  def get_colliding_cells(self, tree_grid: np.ndarray, filled_translated_cells: np.ndarray):
-    contained_cells = self.trim_mask(tree_grid, filled_translated_cells)
-    if len(contained_cells) == 0:
-      return np.array([])
-    collision_indices = np.argwhere(tree_grid[contained_cells[:, 0], contained_cells[:, 1], contained_cells[:, 2]] == CellType.crown.value)
-    collision_cells = contained_cells[collision_indices]
-    
-    return collision_cells.reshape(-1, 3)
+    self.assign_collision_cells(tree1_grid, tree2_grid, tree1_collision_edge_cells, tree2_collision_edge_cells, translation, rng)
   
   def trim_mask(self, tree_grid: np.ndarray, mask: np.ndarray):
     """
@@ -345,9 +522,9 @@ class VoxelGrid:
     :rtype: np.ndarray
     """
     # get only the indices that are within the tree
-    lower_limit = np.array([0, 0, 0])
-    upper_limit = np.array([tree_grid.shape[0], tree_grid.shape[1], tree_grid.shape[2]])
-    tree_contains_cell = np.all(mask >= lower_limit, axis=1) & np.all(mask < upper_limit, axis=1)
+    size_x, size_y, size_z = tree_grid.shape
+    x, y, z = mask[:, 0], mask[:, 1], mask[:, 2]
+    tree_contains_cell = (x >= 0) & (x < size_x) & (y >= 0) & (y < size_y) & (z >= 0) & (z < size_z)
     
     return mask[tree_contains_cell]
     
@@ -364,21 +541,18 @@ class VoxelGrid:
     :rtype: np.ndarray
     """
     
-    # Define neighbor offsets (6-connectivity)
-    neighbor_offsets = np.array([
-        [1, 0, 0], [-1, 0, 0],
-        [0, 1, 0], [0, -1, 0],
-        [0, 0, 1], [0, 0, -1]
-    ])
+    # Only the bounding box of the collision cells plus one cell on each side can contain edge cells.
+    lower = np.maximum(collision_cells.min(axis=0) - 1, 0)
+    upper = np.minimum(collision_cells.max(axis=0) + 2, tree_grid.shape)
+    box = tuple(slice(start, end) for start, end in zip(lower, upper))
     
-    # Get all neighbors
-    neighbors = collision_cells[:, None, :] + neighbor_offsets[None, :, :]
-    neighbors = neighbors.reshape(-1, 3)
-    neighbors = self.trim_mask(tree_grid, neighbors)
+    collision_mask = np.zeros(upper - lower, dtype=bool)
+    local_cells = collision_cells - lower
+    collision_mask[local_cells[:, 0], local_cells[:, 1], local_cells[:, 2]] = True
     
-    # Filter out neighbors that are not edge cells
-    edge_mask = tree_grid[neighbors[:, 0], neighbors[:, 1], neighbors[:, 2]] == CellType.crown.value
-    edge_cells = neighbors[edge_mask]
+    # Filter out neighbors that are not edge cells (6-connectivity)
+    edge_mask = (tree_grid[box] == CellType.crown.value) & (self.get_neighbor_bitmap(collision_mask) != 0)
+    edge_cells = np.argwhere(edge_mask) + lower
     
     return edge_cells
   
@@ -387,7 +561,8 @@ class VoxelGrid:
                              tree2_grid: np.ndarray, 
                              tree1_collision_edge_cells: np.ndarray, 
                              tree2_collision_edge_cells: np.ndarray,
-                             translation: np.ndarray):
+                             translation: np.ndarray,
+                             rng: np.random.Generator):
     """
     Assign collision cells between two voxel grids representing trees.
     This function assigns collision cells between two voxel grids by iterating through a specified number of rounds.
@@ -405,23 +580,29 @@ class VoxelGrid:
     :type tree2_collision_edge_cells: np.ndarray
     :param translation: The translation vector to align the grids.
     :type translation: np.ndarray
+    :param rng: The random generator used to pick the edge cells and sphere radii.
+    :type rng: np.random.Generator
     :return: None
     :rtype: None
     """
     
     rounds = 5
-    min_radius = 1
-    max_radius = 3
+    min_radius = COLLISION_SPHERE_MIN_RADIUS
+    max_radius = COLLISION_SPHERE_MAX_RADIUS
     
     if len(tree1_collision_edge_cells) == 0 or len(tree2_collision_edge_cells) == 0:
       self.assign_rest_of_collision_cells(tree1_grid, tree2_grid, translation)
       return
+    
+    # draw the random values of all rounds at once
+    sphere_radii = rng.integers(min_radius, max_radius + 1, size=rounds)
+    tree1_edge_cell_indices = rng.integers(len(tree1_collision_edge_cells), size=rounds)
+    tree2_edge_cell_indices = rng.integers(len(tree2_collision_edge_cells), size=rounds)
   
     for round in range(rounds):
-      sphere_radius = random.randint(min_radius, max_radius)
-      sphere_cells = self.get_cells_for_sphere(sphere_radius)
+      sphere_cells = self.get_cells_for_sphere(int(sphere_radii[round]))
       
-      collision_edge_cell = random.choice(tree1_collision_edge_cells)
+      collision_edge_cell = tree1_collision_edge_cells[tree1_edge_cell_indices[round]]
       mask = self.trim_mask(tree2_grid, sphere_cells + (collision_edge_cell + translation))
       mask = self.trim_mask(tree1_grid, mask - translation)
       conflicted_contained_cells = mask[tree1_grid[mask[:, 0], mask[:, 1], mask[:, 2]] == CellType.collision.value]
@@ -430,7 +611,7 @@ class VoxelGrid:
       conflicted_contained_cells = conflicted_contained_cells + translation
       tree2_grid[conflicted_contained_cells[:, 0], conflicted_contained_cells[:, 1], conflicted_contained_cells[:, 2]] = CellType.no_tree.value
 
-      collision_edge_cell = random.choice(tree2_collision_edge_cells)
+      collision_edge_cell = tree2_collision_edge_cells[tree2_edge_cell_indices[round]]
       mask = self.trim_mask(tree1_grid, sphere_cells + (collision_edge_cell - translation))
       mask = self.trim_mask(tree2_grid, mask + translation)
       
@@ -445,23 +626,17 @@ class VoxelGrid:
   def get_cells_for_sphere(self, radius: int):
     """
     Get the cells within a sphere of a given radius centered at the origin.
+    The spheres used for assigning collision cells are computed once when the module is loaded.
     
     :param radius: The radius of the sphere.
     :type radius: int
-    :return: A numpy array of shape (N, 3) containing the points inside the sphere.
+    :return: A read-only numpy array of shape (N, 3) containing the points inside the sphere.
     :rtype: np.ndarray
     """
     
-    x = np.arange(-radius, radius + 1)
-    y = np.arange(-radius, radius + 1)
-    z = np.arange(-radius, radius + 1)
-    grid = np.array(np.meshgrid(x, y, z)).T.reshape(-1, 3)
-    
-    distances = np.sum(grid**2, axis=1)
-    
-    inside_sphere = grid[distances <= radius**2]
-    
-    return inside_sphere
+    if radius in SPHERE_CELLS:
+      return SPHERE_CELLS[radius]
+    return compute_sphere_cells(radius)
     
   def assign_rest_of_collision_cells(self, 
                                      tree1_grid: np.ndarray, 
@@ -484,15 +659,12 @@ class VoxelGrid:
     """
     
     tree1_collision_cells = np.argwhere(tree1_grid == CellType.collision.value)
-
-    mask = (tree1_grid != CellType.stem.value) | (tree1_grid != CellType.crown.value)
-    tree1_distances = distance_transform_edt(mask)
-    tree1_conflicted_distances = tree1_distances[tree1_collision_cells[:, 0], tree1_collision_cells[:, 1], tree1_collision_cells[:, 2]]
+    if len(tree1_collision_cells) == 0:
+      return
+    tree1_conflicted_distances = self.get_tree_distances(tree1_grid, tree1_collision_cells)
     
     tree2_collision_cells = tree1_collision_cells + translation
-    mask = (tree2_grid != CellType.stem.value) | (tree2_grid != CellType.crown.value)
-    tree2_distances = distance_transform_edt(mask)
-    tree2_conflicted_distances = tree2_distances[tree2_collision_cells[:, 0], tree2_collision_cells[:, 1], tree2_collision_cells[:, 2]]
+    tree2_conflicted_distances = self.get_tree_distances(tree2_grid, tree2_collision_cells)
     
     tree1_cells_closer = tree1_collision_cells[tree1_conflicted_distances <= tree2_conflicted_distances]
     tree1_cells_farther = tree1_collision_cells[tree1_conflicted_distances > tree2_conflicted_distances]
@@ -506,6 +678,48 @@ class VoxelGrid:
     tree2_grid[tree2_cells_closer[:, 0], tree2_cells_closer[:, 1], tree2_cells_closer[:, 2]] = CellType.crown.value
     tree2_grid[tree2_cells_farther[:, 0], tree2_cells_farther[:, 1], tree2_cells_farther[:, 2]] = CellType.no_tree.value
   
+  def get_tree_distances(self, tree_grid: np.ndarray, cells: np.ndarray, margin: int = 4):
+    """
+    Computes the distance of the given cells to the closest stem or crown cell of the tree.
+    The distance transform only runs on the bounding box of the cells, expanded by a margin. The margin is doubled
+    until every distance is exact, which is the case when it is not larger than the distance to any cell outside
+    of the box.
+    
+    :param tree_grid: The voxel grid representing the tree.
+    :type tree_grid: np.ndarray
+    :param cells: The cells to compute the distances for.
+    :type cells: np.ndarray
+    :param margin: The initial number of cells the bounding box is expanded by.
+    :type margin: int
+    :return: The distance of each cell to the closest stem or crown cell.
+    :rtype: np.ndarray
+    """
+    
+    grid_shape = np.array(tree_grid.shape)
+    lower = cells.min(axis=0)
+    upper = cells.max(axis=0) + 1
+    while True:
+      box_lower = np.maximum(lower - margin, 0)
+      box_upper = np.minimum(upper + margin, grid_shape)
+      box = tuple(slice(start, end) for start, end in zip(box_lower, box_upper))
+      
+      # the distance transform measures the distance to the closest stem or crown cell of the tree
+      mask = (tree_grid[box] != CellType.stem.value) & (tree_grid[box] != CellType.crown.value)
+      local_cells = cells - box_lower
+      distances = distance_transform_edt(mask)[local_cells[:, 0], local_cells[:, 1], local_cells[:, 2]]
+      
+      if np.all(box_lower == 0) and np.all(box_upper == grid_shape):
+        return distances
+      
+      # sides of the box that lie on the grid boundary have no cells beyond them
+      distance_to_outside = np.minimum(
+        np.where(box_lower > 0, local_cells + 1, np.inf),
+        np.where(box_upper < grid_shape, box_upper - cells, np.inf)
+      ).min(axis=1)
+      if not mask.all() and np.all(distances <= distance_to_outside):
+        return distances
+      margin *= 2
+  
   def translate_voxel_to_local_space(self, tree: Tuple[int, int, int, np.ndarray], voxel: Tuple[int, int, int]):
     """
     Translates a voxel in the global space to the local space of the tree.
@@ -523,8 +737,8 @@ class VoxelGrid:
   def greedy_meshing(self, index: int):
     """
     Generate a mesh object using greedy meshing algorithm for a given index.
-    This function generates a mesh object by capturing quads from the voxel grid and creating corresponding geometry 
-    using Blender's bmesh module. The mesh is then positioned based on the tree's location.
+    This function generates a mesh object by capturing quads from the voxel grid and creating a cuboid for each 
+    of them. The mesh is then positioned based on the tree's location.
     
     :param index: The index of the tree for which the mesh is to be generated.
     :type index: int
@@ -536,46 +750,16 @@ class VoxelGrid:
     
     mesh = bpy.data.meshes.new(f"VoxelMesh")
     obj = bpy.data.objects.new(f"VoxelObject_{index}", mesh)
-
-    # Prepare bmesh for geometry creation
-    bm = bmesh.new()
     
-    for quad in quads:
-      x_start, y_start, z_start, x_end, y_end, z_end = quad
-      
-      x_start_translated, y_start_translated, z_start_translated = self.translate_voxel_to_local_space(self.trees[index], (x_start, y_start, z_start))
-      x_end_translated, y_end_translated, z_end_translated = self.translate_voxel_to_local_space(self.trees[index], (x_end, y_end, z_end))
-      
-      x_start_position = x_start_translated - self.cube_size
-      y_start_postion = y_start_translated - self.cube_size
-      z_start_position = z_start_translated - self.cube_size
-      x_end_position = x_end_translated 
-      y_end_position = y_end_translated
-      z_end_position = z_end_translated
-      
-      verts = [
-        (x_start_position, y_start_postion, z_start_position),
-        (x_end_position, y_start_postion, z_start_position),
-        (x_end_position, y_end_position, z_start_position),
-        (x_start_position, y_end_position, z_start_position),
-        (x_start_position, y_start_postion, z_end_position),
-        (x_end_position, y_start_postion, z_end_position),
-        (x_end_position, y_end_position, z_end_position),
-        (x_start_position, y_end_position, z_end_position)
-      ]
-      
-      bm_verts = [bm.verts.new(v) for v in verts]
-
-      # Create faces for the quad
-      bm.faces.new([bm_verts[i] for i in [0, 1, 2, 3]])  # Bottom face
-      bm.faces.new([bm_verts[i] for i in [4, 5, 6, 7]])  # Top face
-      bm.faces.new([bm_verts[i] for i in [0, 1, 5, 4]])  # Front face
-      bm.faces.new([bm_verts[i] for i in [2, 3, 7, 6]])  # Back face
-      bm.faces.new([bm_verts[i] for i in [0, 3, 7, 4]])  # Left face
-      bm.faces.new([bm_verts[i] for i in [1, 2, 6, 5]])  # Right face
+    # Work in half cube sizes so that the corners of trees with an odd grid size stay on whole numbers.
+    # The local space is centered at the stem, see translate_voxel_to_local_space.
+    tree_shape = self.trees[index][-1].shape
+    center = np.array([tree_shape[0], tree_shape[1], 0], dtype=np.int32)
+    start = 2 * quads[:, :3] - center - 2
+    end = 2 * quads[:, 3:] - center
+    cuboid_corners = np.where(CUBOID_CORNERS[None, :, :], end[:, None, :], start[:, None, :])
     
-    bm.to_mesh(mesh)
-    bm.free()  
+    self.build_mesh(mesh, cuboid_corners[:, CUBOID_FACES], self.cube_size / 2, 0.0)
     
     obj.location = tuple(np.array(self.trees[index][:3]) * self.cube_size)
     return self.trees[index][3], obj
@@ -587,205 +771,179 @@ class VoxelGrid:
     
     :param index: The index of the tree in the voxel grid.
     :type index: int
-    :return: A list of captured quads, each represented as a tuple of six integers.
-    :rtype: List[Tuple[int, int, int, int, int, int]]
+    :return: A read-only array of shape (N, 6) holding the captured quads as (x_start, y_start, z_start, x_end, y_end, z_end).
+    :rtype: np.ndarray
     """
     
     instance_matrix = self.trees[index][-1]
     
-    planes = self.capture_planes(instance_matrix)
-    
-    quads: List[Tuple[int, int, int, int, int, int]] = []
-    while len(planes) > 0:
-      z_position, plane_set = next(iter(planes.items()))
-      x_start, y_start, x_end, y_end = next(iter(plane_set))
-      quads.append(self.capture_quad(z_position, x_start, y_start, x_end, y_end, planes))
-    
-    return quads
+    # Trees of the same configuration that were not changed by a collision have identical grids, so their quads are
+    # only captured once.
+    grid_key = (instance_matrix.shape, hashlib.blake2b(np.ascontiguousarray(instance_matrix), digest_size=16).digest())
+    if grid_key not in self.quad_cache:
+      quads = self.capture_quads_from_grid(instance_matrix)
+      quads.setflags(write=False)
+      self.quad_cache[grid_key] = quads
+    return self.quad_cache[grid_key]
   
-  def capture_quad(self, z_position: int, x_start: int, y_start: int, x_end: int, y_end: int, planes: Dict[int, Set[Tuple[int, int, int, int]]]):
+  def capture_quads_from_grid(self, instance_matrix: np.ndarray):
     """
-    Captures a quad segment of a voxel grid by taking a X-Y plane and expanding it vertically until the segments no
-    longer match.
-
-    :param z_position: The initial z-position of the row segment.
-    :type z_position: int
-    :param x_start: The starting x-coordinate of the row segment.
-    :type x_start: int
-    :param y_start: The starting y-coordinate of the row segment.
-    :type y_start: int
-    :param x_end: The ending x-coordinate of the row segment.
-    :type x_end: int
-    :param y_end: The ending y-coordinate of the row segment.
-    :type y_end: int
-    :param planes: A dictionary mapping z-positions to sets of tuples representing row segments.
-    :type planes: Dict[int, Set[Tuple[int, int, int, int]]]
-    :return: The coordinates of the expanded quad segment.
-    :rtype: Tuple[int, int, int, int, int, int]
-    """
-    offset_minus = 0
-    while self.plane_matches_segment_length(z_position + offset_minus, x_start, x_end, y_start, y_end, planes): 
-      offset_minus -= 1
-    offset_minus += 1
-    
-    offset_plus = 1
-    while self.plane_matches_segment_length(z_position + offset_plus, x_start, x_end, y_start, y_end, planes): 
-      offset_plus += 1
-    offset_plus -= 1
-    
-    return x_start, y_start, z_position + offset_minus, x_end, y_end, z_position + offset_plus
-  
-  def plane_matches_segment_length(self, z_position: int, x_start: int, x_end: int, y_start: int, y_end: int, planes: Dict[int, Set[Tuple[int, int, int, int]]]):
+    Captures the quads of the crown cells in a voxel grid, see `capture_quads`.
+    
+    :param instance_matrix: The voxel grid of a tree.
+    :type instance_matrix: np.ndarray
+    :return: An array of shape (N, 6) holding the captured quads as (x_start, y_start, z_start, x_end, y_end, z_end).
+    :rtype: np.ndarray
     """
-    Checks if a plane segment matches the given x_start, y_start, and y_end within the specified z position.
     
-    :param z_position: The z-coordinate of the plane segment.
-    :type z_position: int
-    :param x_start: The starting x-coordinate of the plane segment.
-    :type x_start: int
-    :param y_start: The starting y-coordinate of the plane segment.
-    :type y_start: int
-    :param y_end: The ending y-coordinate of the plane segment.
-    :type y_end: int
-    :param planes: A dictionary mapping z_position to sets of tuples representing plane segments.
-    :type planes: Dict[int, Set[Tuple[int, int, int, int]]]
-    :return: True if the plane segment matches and is removed, False otherwise.
-    :rtype: bool
-    """
-    
-    if z_position not in planes:
-      return False 
-    segments = planes[z_position]
-    
-    for (seg_x_start, seg_y_start, seg_x_end, seg_y_end) in segments:
-      if seg_x_start == x_start and seg_x_end == x_end and seg_y_start == y_start and seg_y_end == y_end:
-        planes[z_position].remove((seg_x_start, seg_y_start, seg_x_end, seg_y_end))
-        if (len(planes[z_position]) == 0):
-          del planes[z_position]
-        return True
-    
-    return False
+    plane_array = self.capture_planes(instance_matrix)
+    
+    # sort by the extents first and the z-position last so that mergeable planes are adjacent
+    plane_array = plane_array[np.lexsort(plane_array.T[::-1])]
+    
+    if capture_quads_from_planes is not None:
+      return capture_quads_from_planes(plane_array)
+    
+    # a quad starts at every plane that does not continue the plane before it by one z-position, and ends before the next
+    continues_previous = np.all(plane_array[1:, :4] == plane_array[:-1, :4], axis=1) & (plane_array[1:, 4] == plane_array[:-1, 4] + 1)
+    starts_quad = np.ones(len(plane_array), dtype=bool)
+    starts_quad[1:] = ~continues_previous
+    ends_quad = np.ones(len(plane_array), dtype=bool)
+    ends_quad[:-1] = ~continues_previous
+    quad_starts = np.flatnonzero(starts_quad)
+    quad_ends = np.flatnonzero(ends_quad)
+    
+    quads = np.empty((len(quad_starts), 6), dtype=np.int32)
+    quads[:, [0, 1, 3, 4]] = plane_array[quad_starts, :4]
+    quads[:, 2] = plane_array[quad_starts, 4]
+    quads[:, 5] = plane_array[quad_ends, 4]
+    return quads
   
-  def capture_planes(self, instance_matrix: np.array):
+  def capture_planes(self, instance_matrix: np.array, crown_mask: np.ndarray = None):
     """
     Captures planes from the given instance matrix by processing row segments on the x-axis.
     
     :param instance_matrix: The instance matrix to process.
     :type instance_matrix: np.array
-    :return: A dictionary mapping z-coordinates to sets of tuples representing captured planes.
-    :rtype: Dict[int, Set[Tuple[int, int, int, int]]]
+    :param crown_mask: An optional boolean mask of the crown cells of the instance matrix, see `capture_rows`.
+    :type crown_mask: np.ndarray
+    :return: An array of shape (N, 5) holding the captured planes as (x_start, y_start, x_end, y_end, z_position).
+    :rtype: np.ndarray
     """
     
-    rows = self.capture_rows(instance_matrix)
-    
-    planes: Dict[int, Set[Tuple[int, int, int, int]]] = {}
-    while len(rows) > 0: 
-      (y_position, z_position), row_set = next(iter(rows.items()))
-      x_start, x_end = next(iter(row_set))
-      plane = self.capture_plane(y_position, z_position, x_start, x_end, rows)
-      if z_position in planes:
-        planes[z_position].add(plane)
-      else:
-        planes[z_position] = {plane}
+    row_array = self.capture_rows(instance_matrix, crown_mask)
+    
+    if capture_planes_compiled is not None:
+      # sort by z, x_start, x_end and y so that rows that can be merged are adjacent
+      row_array = row_array[np.lexsort((row_array[:, 0], row_array[:, 3], row_array[:, 2], row_array[:, 1]))]
+      return capture_planes_compiled(row_array)
+    
+    # Intern the (x_start, x_end) extents as small segment ids, so rows are matched by comparing a single int.
+    extent_keys = (row_array[:, 2].astype(np.int64) << 32) | row_array[:, 3].astype(np.int64)
+    unique_extent_keys, segment_ids = np.unique(extent_keys, return_inverse=True)
+    segment_ids = segment_ids.astype(np.int32).ravel()
+    
+    if capture_planes_from_rows is not None:
+      # The rows are ordered by (y, z), so every (y, z) line is one consecutive group of rows.
+      line_keys = (row_array[:, 0].astype(np.int64) << 32) | row_array[:, 1].astype(np.int64)
+      unique_line_keys, line_starts = np.unique(line_keys, return_index=True)
+      line_ends = np.append(line_starts[1:], len(row_array))
+      return capture_planes_from_rows(row_array, segment_ids, unique_line_keys, line_starts, line_ends)
+    
+    # Keep a python int for every segment of a z-slice whose bit y is set when the line at y contains the segment. 
+    # A plane is a run of set bits, which is found with a few bit operations.
+    bitmap_keys = row_array[:, 1].astype(np.int64) * len(unique_extent_keys) + segment_ids
+    unique_bitmap_keys, bitmap_indices = np.unique(bitmap_keys, return_inverse=True)
+    
+    # the bitmaps are scattered into a boolean array and packed in one go, only the conversion to ints is done per bitmap
+    presence = np.zeros((len(unique_bitmap_keys), instance_matrix.shape[1]), dtype=bool)
+    presence[bitmap_indices.ravel(), row_array[:, 0]] = True
+    packed = np.packbits(presence, axis=1, bitorder='little')
+    packed_bytes = packed.tobytes()
+    bitmap_width = packed.shape[1]
+    bitmaps: List[int] = [
+      int.from_bytes(packed_bytes[start:start + bitmap_width], 'little') for start in range(0, len(packed_bytes), bitmap_width)
+    ]
     
-    return planes
+    # Every plane is captured from its first row, which is a row whose segment is not contained in the line below it. 
+    # Knowing the seeds up front leaves the bitmaps unchanged, so merged rows neither have to be removed nor marked.
+    bitmap_indices = bitmap_indices.ravel()
+    continues_line_below = np.zeros(len(row_array), dtype=bool)
+    has_line_below = row_array[:, 0] > 0
+    continues_line_below[has_line_below] = presence[bitmap_indices[has_line_below], row_array[has_line_below, 0] - 1]
+    seeds = np.flatnonzero(~continues_line_below)
+    
+    # the method and append are looked up once instead of for every seed
+    planes: List[Tuple[int, int, int, int, int]] = []
+    capture_plane = self.capture_plane
+    append_plane = planes.append
+    for (y_position, z_position, x_start, x_end), bitmap_index in zip(row_array[seeds].tolist(), bitmap_indices[seeds].tolist()):
+      append_plane((*capture_plane(y_position, x_start, x_end, bitmaps[bitmap_index]), z_position))
+    
+    return np.array(planes, dtype=np.int32).reshape(-1, 5)
 
-  def capture_plane(self, y_position: int, z_position: int, x_start: int, x_end: int, rows: Dict[Tuple[int, int], Set[Tuple[int, int]]]):
+  def capture_plane(self, y_position: int, x_start: int, x_end: int, bitmap: int):
     """
     Captures a plane by finding the continuous segment of rows that match the given x_start and x_end within the specified y and z positions.
     
     :param y_position: The y-coordinate of the row segment.
     :type y_position: int
-    :param z_position: The z-coordinate of the row segment.
-    :type z_position: int
     :param x_start: The starting x-coordinate of the row segment.
     :type x_start: int
     :param x_end: The ending x-coordinate of the row segment.
     :type x_end: int
-    :param rows: A dictionary mapping (y_position, z_position) to sets of tuples representing row segments.
-    :type rows: Dict[Tuple[int, int], Set[Tuple[int, int]]]
+    :param bitmap: The bitmap of the y-positions whose line in the z-slice contains the segment.
+    :type bitmap: int
     :return: A tuple containing the starting x-coordinate, starting y-coordinate, the ending x-coordinate, and the ending y-coordinate.
     :rtype: Tuple[int, int, int, int]
     """
     
+    # the plane starts above the highest cleared bit below y_position
+    y_start = (~bitmap & ((1 << y_position) - 1)).bit_length()
     
-    # start with zero so the original row gets deleted as well.
-    offset_minus = 0
-    while self.row_matches_segment_length(y_position + offset_minus, z_position, x_start, x_end, rows): 
-      offset_minus -= 1
-    offset_minus += 1
-    offset_plus = 1
-    while self.row_matches_segment_length(y_position + offset_plus, z_position, x_start, x_end, rows): 
-      offset_plus += 1
-    offset_plus -= 1
+    # and ends below the lowest cleared bit above y_position
+    bits_above = bitmap >> y_position
+    y_end = y_position + (~bits_above & (bits_above + 1)).bit_length() - 2
     
-    return x_start, y_position + offset_minus, x_end, y_position + offset_plus
-  
-  def row_matches_segment_length(self, y_position: int, z_position: int, x_start: int, x_end: int, rows: Dict[Tuple[int, int], Set[Tuple[int, int]]]):
-    """
-    Checks if a row segment matches the given x_start and x_end within the specified y and z posutuib.
-    
-    :param y_position: The y-coordinate of the row segment.
-    :type y_position: int
-    :param z_position: The z-coordinate of the row segment.
-    :type z_position: int
-    :param x_start: The starting x-coordinate of the row segment.
-    :type x_start: int
-    :param x_end: The ending x-coordinate of the row segment.
-    :type x_end: int
-    :param rows: A dictionary mapping (y_position, z_position) to sets of tuples representing row segments.
-    :type rows: Dict[Tuple[int, int], Set[Tuple[int, int]]]
-    :return: True if the row segment matches and is removed, False otherwise.
-    :rtype: bool
-    """
-    
-    if (y_position, z_position) not in rows:
-      return False 
-    segments = rows[(y_position, z_position)]
-    
-    for (seg_x_start, seg_x_end) in segments:
-      if seg_x_start == x_start and seg_x_end == x_end:
-        rows[(y_position, z_position)].remove((seg_x_start, seg_x_end))
-        if (len(rows[(y_position, z_position)]) == 0):
-          del rows[(y_position, z_position)]
-        return True
-    
-    return False
+    return x_start, y_start, x_end, y_end
    
-  def capture_rows(self, instance_matrix: np.array):
+  def capture_rows(self, instance_matrix: np.array, crown_mask: np.ndarray = None):
     """
     Captures rows of a voxel grid by identifying the start and end positions of segments along the x-axis from the
     given instance matrix.
     
     :param instance_matrix: A 3D numpy array representing the voxel grid.
     :type instance_matrix: np.array
-    :return: A dictionary mapping (y, z) coordinates to sets of tuples representing the start and end x-coordinates of row segments.
-    :rtype: Dict[Tuple[int, int], Set[Tuple[int, int]]]
+    :param crown_mask: An optional boolean mask of the crown cells of the instance matrix, if the caller already has one.
+    :type crown_mask: np.ndarray
+    :return: An array of shape (N, 4) holding the row segments as (y, z, x_start, x_end). The pure python implementation
+             returns them ordered by y, z and x_start.
+    :rtype: np.ndarray
     """
-    instance_matrix = (instance_matrix == CellType.crown.value) * 1
-    
-    diff_x = np.diff(instance_matrix, axis=0, append=0, prepend=0)
+    # the compiled kernels take the crown mask as an int8 grid in which the crown cells are ones
+    if crown_mask is not None:
+      grid, crown_value = crown_mask.view(np.int8), 1
+    else:
+      grid, crown_value = instance_matrix, CellType.crown.value
     
-    start_x, start_y, start_z = np.where(diff_x > 0)
-    end_x, end_y, end_z = np.where(diff_x < 0)
+    if capture_rows_compiled is not None:
+      return capture_rows_compiled(np.ascontiguousarray(grid, dtype=np.int8), crown_value)
+    if capture_rows_from_grid is not None:
+      return capture_rows_from_grid(grid, crown_value)
     
-    border_positions = list(zip(start_x, start_y, start_z, np.zeros(len(start_x))))
-    border_positions.extend(zip(end_x - 1, end_y, end_z, np.ones(len(end_x))))
+    if crown_mask is None:
+      crown_mask = np.equal(instance_matrix, CellType.crown.value, out=np.empty(instance_matrix.shape, dtype=bool))
     
-    sorted_start_and_end = sorted(border_positions, key=lambda x: (x[0], x[3]))
+    # move x to the last axis so the borders found below are ordered by (y, z, x), the int8 view shares the mask's memory
+    diff_x = np.diff(crown_mask.transpose(1, 2, 0).view(np.int8), axis=-1, prepend=np.int8(0), append=np.int8(0))
     
-    start_map: Dict[Tuple[int, int], int] = {}
+    # Within every (y, z) line starts and ends alternate, so the k-th start and the k-th end belong to the same row.
+    starts = np.argwhere(diff_x > 0)
+    end_x = np.nonzero(diff_x < 0)[2]
     
-    rows: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
-    for begin_or_end in sorted_start_and_end:
-      if begin_or_end[3] == 0:
-        start_map[(begin_or_end[1], begin_or_end[2])] = begin_or_end[0]
-      else:
-        start = start_map[(begin_or_end[1], begin_or_end[2])]
-        if (begin_or_end[1], begin_or_end[2]) in rows:
-          rows[(begin_or_end[1], begin_or_end[2])].add((start, begin_or_end[0]))
-        else:
-          rows[(begin_or_end[1], begin_or_end[2])] = {(start, begin_or_end[0])}
+    rows = np.empty((len(starts), 4), dtype=np.int32)
+    rows[:, :3] = starts
+    rows[:, 3] = end_x - 1
     
     return rows
     
\ No newline at end of file